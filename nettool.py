@@ -1,143 +1,558 @@
 import argparse
-import json
+import atexit
+import functools
+import itertools
+import os
 import re
+import selectors
+import signal
+import socket
+import struct
 import subprocess
 import sys
+import time
 from datetime import datetime
 from pathlib import Path
 import platform
-import csv
+# concurrent.futures, csv, json and ijson are imported where they're used:
+# most invocations (list, add, ping, an ICMP scan) never need them.
 
-print("Running:", __file__)
+try:
+    import orjson  # optional: C-implemented JSON, noticeably faster on large histories
+except ImportError:
+    orjson = None
 
 
 HOSTS_DB = Path("hosts.json")
-RESULTS_DB = Path("results.json")
+RESULTS_DB = Path("results.ndjson")      # append-only scan history, one record per line
+LATEST_DB = Path("latest.json")           # {host: newest record}
+LEGACY_RESULTS_DB = Path("results.json")  # pre-NDJSON store, migrated on first use
+DNS_CACHE_DB = Path("dns_cache.json")     # {host: [ipv4, expiry epoch seconds]}
+DNS_TTL = 900                             # seconds a resolved address is reused
+
+# CSV column order for `export`; fields missing from older records come out empty
+EXPORT_FIELDS = ("host", "reachable", "latency_ms", "timestamp", "raw_exit", "attempts", "successes")
+
+# Evaluated once: platform.system() is not free and every ping needs the answer
+_IS_WINDOWS = platform.system().lower().startswith("win")
+# One echo with a timeout: Windows takes -w in ms, Linux/mac take -W in seconds
+_PING_PREFIX = ("ping", "-n", "1", "-w") if _IS_WINDOWS else ("ping", "-c", "1", "-W")
 
 # ---------- Storage helpers ----------
+def _json_dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    import json
+    return (json.dumps(obj, separators=(",", ":")) + "\n").encode("utf-8")
+
+def _json_loads(data: bytes):
+    if orjson is not None:
+        return orjson.loads(data)
+    import json
+    return json.loads(data)
+
+def _file_stamp(path: Path):
+    """(mtime_ns, size) for cache keys, or None if the file doesn't exist."""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+# The parsed-file caches below are keyed on the file's stamp, so edits made
+# outside this process are picked up; our own saves also clear them outright.
+@functools.lru_cache(maxsize=1)
+def _load_hosts_cached(path: Path, stamp):
+    import json
+    with path.open("r", encoding="utf-8") as f:
+        return tuple(json.load(f))
+
 def load_hosts():
-    if not HOSTS_DB.exists(): return []
-    with HOSTS_DB.open("r", encoding="utf-8") as f:
-        return json.load(f)
+    stamp = _file_stamp(HOSTS_DB)
+    if stamp is None: return []
+    return list(_load_hosts_cached(HOSTS_DB, stamp))
 
 def save_hosts(hosts):
+    import json
     with HOSTS_DB.open("w", encoding="utf-8") as f:
-        json.dump(hosts, f, indent=2)
+        json.dump(hosts, f, separators=(",", ":"))
+    _load_hosts_cached.cache_clear()
 
-def load_results():
-    if not RESULTS_DB.exists(): return []
-    with RESULTS_DB.open("r", encoding="utf-8") as f:
-        return json.load(f)
+def _iter_ndjson(path: Path):
+    with path.open("rb") as f:
+        for line in f:
+            if line.strip():
+                yield _json_loads(line)
 
-def save_results(results):
-    with RESULTS_DB.open("w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2)
+def _iter_legacy_results():
+    """Records from an old results.json, streamed with ijson when it's installed."""
+    try:
+        import ijson  # optional
+    except ImportError:
+        ijson = None
+    with LEGACY_RESULTS_DB.open("rb") as f:
+        if ijson is None:
+            data = _json_loads(f.read())
+            yield from (data["history"] if isinstance(data, dict) else data)
+            return
+        # Bare list (oldest format) or {"history": [...], "latest": {...}}
+        prefix = "history.item" if f.read(64).lstrip()[:1] == b"{" else "item"
+        f.seek(0)
+        yield from ijson.items(f, prefix, use_float=True)
+
+def _latest_per_host(records):
+    """Newest record per host in one pass, holding only O(hosts) records."""
+    latest = {}
+    for r in records:
+        prev = latest.get(r["host"])
+        # Records older than timestamp_ns count as 0; history is in scan order, so ties go to the later one
+        if prev is None or r.get("timestamp_ns", 0) >= prev.get("timestamp_ns", 0):
+            latest[r["host"]] = r
+    return latest
+
+def latest_per_host_stream(path: Path = RESULTS_DB):
+    """Rebuild the latest-per-host index by streaming an NDJSON history file."""
+    return _latest_per_host(_iter_ndjson(path))
+
+@functools.lru_cache(maxsize=1)
+def _load_latest_cached(path: Path, stamp):
+    with path.open("rb") as f:
+        return _json_loads(f.read())
+
+def _save_latest(latest):
+    with LATEST_DB.open("wb") as f:
+        f.write(_json_dumps(latest))
+    _load_latest_cached.cache_clear()
+
+def _migrate_legacy_results():
+    """One-shot conversion of an old results.json (list or history/latest dict) to NDJSON + latest.json."""
+    if RESULTS_DB.exists() or not LEGACY_RESULTS_DB.exists(): return
+    # Write under a temp name so an interrupted migration is retried instead of left half-done
+    tmp = RESULTS_DB.with_name(RESULTS_DB.name + ".tmp")
+    with tmp.open("wb") as f:
+        for r in _iter_legacy_results():
+            f.write(_json_dumps(r))
+    tmp.replace(RESULTS_DB)
+    _save_latest(latest_per_host_stream(RESULTS_DB))
+
+def iter_results():
+    """Yield every stored scan record, oldest first, without loading the whole history."""
+    _migrate_legacy_results()
+    if not RESULTS_DB.exists(): return
+    yield from _iter_ndjson(RESULTS_DB)
+
+def load_latest():
+    """Returns {host: newest record}; rebuilt from the history if latest.json is missing."""
+    _migrate_legacy_results()
+    stamp = _file_stamp(LATEST_DB)
+    if stamp is None:
+        if not RESULTS_DB.exists(): return {}
+        latest = latest_per_host_stream(RESULTS_DB)
+        _save_latest(latest)
+        return latest
+    # Shallow copy: callers may add hosts, but never mutate the records themselves
+    return dict(_load_latest_cached(LATEST_DB, stamp))
+
+def save_results(batch):
+    """Append a scan batch to the history and refresh the per-host latest index."""
+    latest = load_latest()
+    with RESULTS_DB.open("ab") as f:
+        for r in batch:
+            f.write(_json_dumps(r))
+    for r in batch:
+        # Scan records are always newer than anything already stored
+        latest[r["host"]] = r
+    _save_latest(latest)
+
+# ---------- DNS cache ----------
+_DNS_CACHE = None  # loaded from DNS_CACHE_DB on first use
+_dns_cache_dirty = False
+
+def _dns_cache():
+    global _DNS_CACHE
+    if _DNS_CACHE is None:
+        _DNS_CACHE = {}
+        if DNS_CACHE_DB.exists():
+            try:
+                with DNS_CACHE_DB.open("rb") as f:
+                    data = _json_loads(f.read())
+            except (OSError, ValueError):
+                data = None  # unreadable cache is just a cold cache
+            if isinstance(data, dict):
+                # Keep only well-formed [addr, expiry] entries; anything else is dropped
+                _DNS_CACHE = {
+                    h: e for h, e in data.items()
+                    if isinstance(e, list) and len(e) == 2
+                    and isinstance(e[0], str) and isinstance(e[1], (int, float))
+                }
+        atexit.register(_save_dns_cache)
+    return _DNS_CACHE
+
+def _save_dns_cache():
+    if not _dns_cache_dirty: return
+    now = time.time()
+    live = {h: e for h, e in _DNS_CACHE.items() if e[1] > now}
+    with DNS_CACHE_DB.open("wb") as f:
+        f.write(_json_dumps(live))
+
+def _dns_cache_get(host: str):
+    entry = _dns_cache().get(host)
+    if entry and entry[1] > time.time():
+        return entry[0]
+    return None
+
+def _is_ip_literal(host: str) -> bool:
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, host)
+            return True
+        except OSError:
+            pass
+    return False
+
+def resolve(host: str, ttl: int = DNS_TTL) -> str:
+    """
+    IPv4 address for host, reusing lookups for `ttl` seconds (also across runs).
+    Raises socket.gaierror if the name doesn't resolve (or isn't a valid hostname).
+    """
+    global _dns_cache_dirty
+    if _is_ip_literal(host):
+        # IP literal: no DNS involved, so nothing worth caching (or writing to disk).
+        # getaddrinfo still normalises it and rejects IPv6 for this AF_INET lookup.
+        return socket.getaddrinfo(host, None, family=socket.AF_INET, type=socket.SOCK_DGRAM)[0][4][0]
+    addr = _dns_cache_get(host)
+    if addr is None:
+        try:
+            addr = socket.getaddrinfo(host, None, family=socket.AF_INET, type=socket.SOCK_DGRAM)[0][4][0]
+        except UnicodeError as e:
+            # The idna codec rejects malformed names (empty or >63-char labels) before any lookup
+            raise socket.gaierror(socket.EAI_NONAME, f"invalid hostname: {e}") from e
+        _dns_cache()[host] = [addr, time.time() + ttl]
+        _dns_cache_dirty = True
+    return addr
 
 # ---------- Ping logic ----------
-def _ping_command(host: str):
-    system = platform.system().lower()
-    if "windows" in system:
-        # One echo, 1s timeout: -n 1 -w 1000
-        return ["ping", "-n", "1", "-w", "1000", host]
-    else:
-        # Linux/mac: one packet, 1s timeout
-        # mac uses -W in ms? On mac, -W is in ms with recent versions; to be safe use 1 second timeout via -W 1000 if supported; -t for TTL on mac not needed.
-        # Most reliably: -c 1 -W 1 (seconds) works on Linux; mac's ping uses -W (ms) only in newer versions.
-        # We'll still try -W 1; if it fails, the call will just time out by default.
-        return ["ping", "-c", "1", "-W", "1", host]
-
-_LATENCY_RE = re.compile(r"time[=<]?\s*(\d+(?:\.\d+)?)\s*ms", re.IGNORECASE)
-
-def ping_once(host: str, timeout_ms: int = 1000):
+# Parse "time=XX ms" or "time<1 ms" straight from ping's raw (undecoded) output
+_LATENCY_RE = re.compile(rb"time[=<]?\s*(\d+(?:\.\d+)?)\s*ms", re.IGNORECASE)
+
+def _ping_argv(host: str, timeout_ms: int):
+    """Build the ping command line and a subprocess timeout (s) for one attempt."""
+    if _IS_WINDOWS:
+        return [*_PING_PREFIX, str(timeout_ms), host], max(1, timeout_ms/1000 + 1)
+    sec = max(1, int(round(timeout_ms / 1000)))
+    return [*_PING_PREFIX, str(sec), host], sec + 1
+
+def _parse_latency(stdout: bytes, stderr: bytes, returncode: int):
+    m = _LATENCY_RE.search(stdout or b"")
+    if m is None and returncode != 0:
+        m = _LATENCY_RE.search(stderr or b"")
+    if m:
+        try:
+            return float(m.group(1))
+        except ValueError:
+            pass
+    return None
+
+def _run_capture(cmd, timeout: float):
     """
-    Run a single ping attempt to host with a timeout (ms).
-    Returns tuple: (reachable: bool, latency_ms: float|None, returncode: int, stdout+stderr: str)
+    Run cmd and collect its output; returns (returncode, stdout, stderr) as bytes.
+    Uses os.posix_spawnp (vfork-style, no page-table copy) where available and
+    reads the pipes directly; raises subprocess.TimeoutExpired after killing the child.
     """
-    # Build command based on OS
-    system = platform.system().lower()
-    if "windows" in system:
-        # -n 1 => one echo; -w => timeout in ms
-        cmd = ["ping", "-n", "1", "-w", str(timeout_ms), host]
-    else:
-        # Linux/mac: -c 1 => one packet; -W => timeout (Linux: seconds; mac: varies by version)
-        # Use seconds for Linux; convert ms->s (ceil to 1 second minimum)
-        sec = max(1, int(round(timeout_ms / 1000)))
-        cmd = ["ping", "-c", "1", "-W", str(sec), host]
+    if not hasattr(os, "posix_spawnp"):  # Windows
+        p = subprocess.run(cmd, capture_output=True, timeout=timeout)
+        return p.returncode, p.stdout, p.stderr
 
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
     try:
-        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=max(1, timeout_ms/1000 + 1))
-        out = (proc.stdout or "") + "\n" + (proc.stderr or "")
-        reachable = proc.returncode == 0
-
-        # Try to parse "time=XX ms" or "time<1 ms"
-        latency = None
-        m = _LATENCY_RE.search(out)
-        if m:
-            try:
-                latency = float(m.group(1))
-            except ValueError:
-                latency = None
-
-        return reachable, latency, proc.returncode, out
+        pid = os.posix_spawnp(cmd[0], cmd, os.environ, file_actions=[
+            (os.POSIX_SPAWN_DUP2, out_w, 1),
+            (os.POSIX_SPAWN_DUP2, err_w, 2),
+        ])
+    except BaseException:
+        os.close(out_r)
+        os.close(err_r)
+        raise
+    finally:
+        os.close(out_w)
+        os.close(err_w)
+
+    chunks = {out_r: [], err_r: []}
+    deadline = time.monotonic() + timeout
+    # A selector (epoll/kqueue/poll) rather than select(), which can't take fds >= 1024
+    # and a wide fallback scan holds two pipes per concurrent ping
+    sel = selectors.DefaultSelector()
+    try:
+        sel.register(out_r, selectors.EVENT_READ)
+        sel.register(err_r, selectors.EVENT_READ)
+        while sel.get_map():
+            remaining = deadline - time.monotonic()
+            ready = sel.select(remaining) if remaining > 0 else []
+            if not ready:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            for key, _events in ready:
+                data = os.read(key.fd, 65536)
+                if data:
+                    chunks[key.fd].append(data)
+                else:
+                    sel.unregister(key.fd)
+        _, status = os.waitpid(pid, 0)
+    finally:
+        sel.close()
+        os.close(out_r)
+        os.close(err_r)
+    return os.waitstatus_to_exitcode(status), b"".join(chunks[out_r]), b"".join(chunks[err_r])
+
+def ping_once_subprocess(host: str, timeout_ms: int = 1000):
+    """Run a single ping attempt through the system `ping` binary."""
+    cmd, proc_timeout = _ping_argv(host, timeout_ms)
+    try:
+        rc, stdout, stderr = _run_capture(cmd, proc_timeout)
+        return (rc == 0), _parse_latency(stdout, stderr, rc), rc
     except subprocess.TimeoutExpired:
-        return False, None, 124, ""  # 124 commonly used as timeout code
-      
-    """""
-    Returns dict: {'host': str, 'reachable': bool, 'latency_ms': float|None, 'timestamp': iso}
-    """""
-    cmd = _ping_command(host)
+        return False, None, 124  # timeout
+    except OSError:
+        return False, None, 127  # couldn't run `ping` (not installed, not executable)
+
+# ---------- ICMP echo (no subprocess) ----------
+_ICMP_ECHO_REQUEST = 8
+_ICMP_ECHO_REPLY = 0
+_ICMP_IDENT = os.getpid() & 0xFFFF
+_ICMP_SEQ = itertools.count(1)
+
+def _icmp_checksum(data: bytes) -> int:
+    """16-bit one's-complement checksum (RFC 1071)."""
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+def _icmp_echo_packet(seq: int) -> bytes:
+    header = struct.pack("!BBHHH", _ICMP_ECHO_REQUEST, 0, 0, _ICMP_IDENT, seq)
+    return struct.pack("!BBHHH", _ICMP_ECHO_REQUEST, 0, _icmp_checksum(header), _ICMP_IDENT, seq)
+
+class IcmpUnavailable(OSError):
+    """Neither kind of ICMP socket could be opened; callers fall back to the `ping` binary."""
+
+def _open_icmp_socket():
+    """
+    Open an ICMP socket: unprivileged SOCK_DGRAM ("ping socket") if the kernel
+    allows it, else SOCK_RAW. Returns (sock, is_raw); raises IcmpUnavailable if neither works.
+    """
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+    except OSError:
+        pass
     try:
-        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=3)
-        out = (proc.stdout or "") + "\n" + (proc.stderr or "")
-        reachable = proc.returncode == 0
+        return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+    except OSError as e:
+        raise IcmpUnavailable(*e.args) from e
+
+def _echo_reply_seq(data: bytes, is_raw: bool):
+    """Sequence number if `data` is an echo reply to one of our requests, else None."""
+    if data and data[0] >> 4 == 4:
+        # Raw sockets (and macOS's SOCK_DGRAM ping sockets) hand us the IPv4 header too;
+        # an ICMP message never starts with 0x4_, so this can't misfire on Linux DGRAM replies
+        data = data[(data[0] & 0x0F) * 4:]
+    if len(data) < 8:
+        return None
+    icmp_type, _code, _csum, ident, seq = struct.unpack("!BBHHH", data[:8])
+    if icmp_type != _ICMP_ECHO_REPLY:
+        return None
+    # Raw sockets see every ICMP packet on the host, so check the ident there;
+    # the kernel rewrites it on SOCK_DGRAM sockets
+    if is_raw and ident != _ICMP_IDENT:
+        return None
+    return seq
+
+def ping_once_icmp(host: str, timeout_ms: int = 1000):
+    """
+    Send one ICMP echo from this process and time the reply.
+    Returns (reachable, latency_ms, returncode) like ping_once_subprocess;
+    raises IcmpUnavailable if no ICMP socket can be opened (caller falls back).
+    Hosts without an IPv4 address (IPv6-only, or unknown) go to the `ping`
+    binary, which handles IPv6 and reports unknown names itself.
+    """
+    try:
+        addr = resolve(host)
+    except socket.gaierror:
+        return ping_once_subprocess(host, timeout_ms=timeout_ms)
+    sock, is_raw = _open_icmp_socket()
+    with sock:
+        seq = next(_ICMP_SEQ) & 0xFFFF
+        deadline = time.perf_counter_ns() + timeout_ms * 1_000_000
+        try:
+            t0 = time.perf_counter_ns()
+            sock.sendto(_icmp_echo_packet(seq), (addr, 0))
+            while True:
+                remaining = deadline - time.perf_counter_ns()
+                if remaining <= 0:
+                    return False, None, 1
+                sock.settimeout(remaining / 1e9)
+                data, (src, _port) = sock.recvfrom(1024)
+                if src == addr and _echo_reply_seq(data, is_raw) == seq:
+                    return True, (time.perf_counter_ns() - t0) / 1e6, 0
+        except socket.timeout:
+            return False, None, 1
+        except OSError:
+            return False, None, 2  # e.g. network unreachable
+
+_icmp_unavailable = False
 
-        latency = None
-        m = _LATENCY_RE.search(out)
-        if m:
-            try:
-                latency = float(m.group(1))
-            except ValueError:
-                latency = None
-
-        return {
-            "host": host,
-            "reachable": bool(reachable),
-            "latency_ms": latency,
-            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
-            "raw_exit": proc.returncode
-        }
-    except subprocess.TimeoutExpired:
-        return {
-            "host": host,
-            "reachable": False,
-            "latency_ms": None,
-            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
-            "raw_exit": "timeout"
-        }
+def ping_once(host: str, timeout_ms: int = 1000):
+    """Run a single ping attempt; ICMP socket first, `ping` binary if we can't open one."""
+    global _icmp_unavailable
+    if not _icmp_unavailable:
+        try:
+            return ping_once_icmp(host, timeout_ms=timeout_ms)
+        except IcmpUnavailable:
+            _icmp_unavailable = True
+    return ping_once_subprocess(host, timeout_ms=timeout_ms)
+
+def _host_result(host: str, best, last_rc, attempts: int, successes: int):
+    now_ns = time.time_ns()
+    return {
+        "host": host,
+        "reachable": successes > 0,
+        "latency_ms": best,
+        "timestamp": datetime.utcfromtimestamp(now_ns // 1_000_000_000).isoformat(timespec="seconds") + "Z",
+        "timestamp_ns": now_ns,  # for ordering; "timestamp" is for display
+        "raw_exit": last_rc,
+        "attempts": attempts,
+        "successes": successes,
+    }
+
+def ping_host(host: str, retries: int = 3, timeout_ms: int = 1000, all_attempts: bool = False,
+              ping_fn=ping_once):
+    """
+    Try up to `retries`, stopping at the first success. With all_attempts,
+    make every try and keep the best (lowest) latency. Each try is one ping_fn call.
+    """
+    best = None
+    successes = 0
+    last_rc = None
+    attempts = 0
+    for attempts in range(1, max(1, retries) + 1):
+        ok, lat, rc = ping_fn(host, timeout_ms=timeout_ms)
+        last_rc = rc
+        if ok:
+            successes += 1
+            if lat is not None and (best is None or lat < best):
+                best = lat
+            if not all_attempts:
+                break
+    return _host_result(host, best, last_rc, attempts, successes)
+
+def ping_many_icmp(hosts, retries: int = 3, timeout_ms: int = 1000, all_attempts: bool = False,
+                   concurrency: int = 32):
+    """
+    Ping all hosts over one shared ICMP socket. Each round fires every echo
+    request back to back, then drains the replies with a single selector loop,
+    so a round costs one timeout no matter how many hosts there are.
+    Hosts that answered drop out of later rounds unless all_attempts is set.
+    Hosts without an IPv4 address are pinged through ping_hosts_threaded
+    (`ping` binary, up to `concurrency` at once) after the sweep.
+    Returns ping_host-style dicts in host order; raises IcmpUnavailable if no ICMP socket can be opened.
+    """
+    sock, is_raw = _open_icmp_socket()
+    addrs = {}
+    others = []
+    for h in hosts:
+        try:
+            addrs[h] = resolve(h)
+        except socket.gaierror:
+            others.append(h)
+    v4_hosts = list(addrs)
+    best = dict.fromkeys(v4_hosts)
+    successes = dict.fromkeys(v4_hosts, 0)
+    last_rc = dict.fromkeys(v4_hosts)
+    attempts = dict.fromkeys(v4_hosts, 0)
+    with sock, selectors.DefaultSelector() as sel:
+        sel.register(sock, selectors.EVENT_READ)
+        for _ in range(max(1, retries)):
+            active = v4_hosts if all_attempts else [h for h in v4_hosts if not successes[h]]
+            if not active:
+                break
+            pending = {}  # seq -> (host, addr, send time)
+            for h in active:
+                attempts[h] += 1
+                seq = next(_ICMP_SEQ) & 0xFFFF
+                try:
+                    sock.sendto(_icmp_echo_packet(seq), (addrs[h], 0))
+                except OSError:
+                    last_rc[h] = 2  # e.g. network unreachable
+                    continue
+                pending[seq] = (h, addrs[h], time.perf_counter_ns())
+
+            deadline = time.perf_counter_ns() + timeout_ms * 1_000_000
+            while pending:
+                remaining = deadline - time.perf_counter_ns()
+                if remaining <= 0 or not sel.select(remaining / 1e9):
+                    break
+                try:
+                    data, (src, _port) = sock.recvfrom(1024)
+                except OSError:
+                    continue  # e.g. a queued ICMP error; keep waiting for the others
+                seq = _echo_reply_seq(data, is_raw)
+                entry = pending.get(seq)
+                if entry is None or entry[1] != src:
+                    continue
+                del pending[seq]
+                h, _addr, t0 = entry
+                lat = (time.perf_counter_ns() - t0) / 1e6
+                last_rc[h] = 0
+                successes[h] += 1
+                if best[h] is None or lat < best[h]:
+                    best[h] = lat
+            for h, _addr, _t0 in pending.values():
+                last_rc[h] = 1
+    results = {h: _host_result(h, best[h], last_rc[h], attempts[h], successes[h]) for h in v4_hosts}
+    if others:
+        results.update(zip(others, ping_hosts_threaded(
+            others, retries=retries, timeout_ms=timeout_ms, all_attempts=all_attempts, concurrency=concurrency,
+            ping_fn=ping_once_subprocess)))  # already failed to resolve; don't look them up again
+    return [results[h] for h in hosts]
+
+def ping_hosts_threaded(hosts, retries: int = 3, timeout_ms: int = 1000, all_attempts: bool = False,
+                        concurrency: int = 32, ping_fn=ping_once):
+    """
+    ping_host for every host on a thread pool; results come back in host order.
+    Threads suit the `ping` binary fallback: each one mostly waits on its child
+    with the GIL released, so up to `concurrency` pings overlap.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    ping = functools.partial(ping_host, retries=retries, timeout_ms=timeout_ms, all_attempts=all_attempts,
+                             ping_fn=ping_fn)
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as ex:
+        return list(ex.map(ping, hosts))
 
 # ---------- Commands ----------
 def cmd_add(args):
-    hosts = load_hosts()
+    # dict keeps insertion order with O(1) membership; hosts.json stays a list
+    existing = dict.fromkeys(load_hosts())
     new_hosts = []
     for h in args.hosts:
         h = h.strip()
-        if h and h not in hosts:
-            hosts.append(h)
+        if h and h not in existing:
+            existing[h] = None
             new_hosts.append(h)
-    save_hosts(hosts)
+    save_hosts(list(existing))
     if new_hosts:
         print("Added:", ", ".join(new_hosts))
     else:
         print("No new hosts added (maybe they already exist).")
 
 def cmd_remove(args):
-    hosts = load_hosts()
-    before = set(hosts)
-    for h in args.hosts:
-        if h in hosts:
-            hosts.remove(h)
-    save_hosts(hosts)
-    removed = before - set(hosts)
+    existing = dict.fromkeys(load_hosts())
+    removed = {h for h in args.hosts if h in existing}
+    for h in removed:
+        del existing[h]
+    save_hosts(list(existing))
     if removed:
         print("Removed:", ", ".join(sorted(removed)))
     else:
@@ -151,67 +566,16 @@ def cmd_list(args):
     print("Saved hosts:")
     for i, h in enumerate(hosts, start=1):
         print(f"{i:2d}. {h}")
-        import platform, subprocess, re
-from datetime import datetime
-
-# Parse "time=XX ms" or "time<1 ms"
-_LATENCY_RE = re.compile(r"time[=<]?\s*(\d+(?:\.\d+)?)\s*ms", re.IGNORECASE)
 
-def print_result(r):
+def print_result(r, _tmpl="%-28s %-5s %10s  (%s)\n"):
+    latency = r["latency_ms"]
     reach = "UP" if r["reachable"] else "DOWN"
-    lat = f"{r['latency_ms']:.2f} ms" if r["latency_ms"] is not None else "-"
-    print(f"{r['host']:<28} {reach:<5} {lat:>10}  ({r['timestamp']})")
-
-def ping_once(host: str, timeout_ms: int = 1000):
-    """Run a single ping attempt."""
-    sysname = platform.system().lower()
-    if "windows" in sysname:
-        cmd = ["ping", "-n", "1", "-w", str(timeout_ms), host]       # Windows
-        proc_timeout = max(1, timeout_ms/1000 + 1)
-    else:
-        sec = max(1, int(round(timeout_ms / 1000)))
-        cmd = ["ping", "-c", "1", "-W", str(sec), host]              # Linux/mac
-        proc_timeout = sec + 1
-    try:
-        p = subprocess.run(cmd, capture_output=True, text=True, timeout=proc_timeout)
-        out = (p.stdout or "") + "\n" + (p.stderr or "")
-        reachable = (p.returncode == 0)
-        latency = None
-        m = _LATENCY_RE.search(out)
-        if m:
-            try:
-                latency = float(m.group(1))
-            except ValueError:
-                pass
-        return reachable, latency, p.returncode
-    except subprocess.TimeoutExpired:
-        return False, None, 124  # timeout
-
-def ping_host(host: str, retries: int = 3, timeout_ms: int = 1000):
-    """Try up to `retries`; keep best (lowest) latency if any succeed."""
-    best = None
-    successes = 0
-    last_rc = None
-    for _ in range(max(1, retries)):
-        ok, lat, rc = ping_once(host, timeout_ms=timeout_ms)
-        last_rc = rc
-        if ok:
-            successes += 1
-            if lat is not None and (best is None or lat < best):
-                best = lat
-    return {
-        "host": host,
-        "reachable": successes > 0,
-        "latency_ms": best,
-        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
-        "raw_exit": last_rc,
-        "attempts": max(1, retries),
-        "successes": successes,
-    }
-
+    lat = "%.2f ms" % latency if latency is not None else "-"
+    sys.stdout.write(_tmpl % (r["host"], reach, lat, r["timestamp"]))
 
 def cmd_ping(args):
-    result = ping_host(args.host, retries=args.retries, timeout_ms=args.timeout_ms)
+    result = ping_host(args.host, retries=args.retries, timeout_ms=args.timeout_ms,
+                       all_attempts=args.all_attempts)
     print_result(result)
 
 def cmd_scan(args):
@@ -219,35 +583,32 @@ def cmd_scan(args):
     if not hosts:
         print("No hosts saved.")
         return
-    print(f"Scanning {len(hosts)} host(s)… (retries={args.retries}, timeout={args.timeout_ms}ms)\n")
+    print(f"Scanning {len(hosts)} host(s)… (retries={args.retries}, timeout={args.timeout_ms}ms, concurrency={args.concurrency})\n")
 
-    results = load_results()
-    batch = []
+    try:
+        batch = ping_many_icmp(hosts, retries=args.retries, timeout_ms=args.timeout_ms,
+                               all_attempts=args.all_attempts, concurrency=args.concurrency)
+    except IcmpUnavailable:
+        # No ICMP socket: fan out `ping` subprocesses on threads instead, straight to
+        # the binary (ping_once would resolve each host before finding that out again)
+        batch = ping_hosts_threaded(hosts, retries=args.retries, timeout_ms=args.timeout_ms,
+                                    all_attempts=args.all_attempts, concurrency=args.concurrency,
+                                    ping_fn=ping_once_subprocess)
     up = 0
-    for h in hosts:
-        r = ping_host(h, retries=args.retries, timeout_ms=args.timeout_ms)
-        batch.append(r)
+    for r in batch:
         if r["reachable"]:
             up += 1
         print_result(r)
 
-    results.extend(batch)
-    save_results(results)
+    save_results(batch)
     print("\nSummary:", f"{up}/{len(hosts)} reachable")
 
 def cmd_report(args):
     # Build report from the most recent results for each host
-    results = load_results()
-    if not results:
+    latest = load_latest()
+    if not latest:
         print("No results yet. Run: python nettool.py scan")
         return
-    # Keep latest per host
-    latest = {}
-    for r in results:
-        host = r["host"]
-        ts = r.get("timestamp") or ""
-        if host not in latest or ts > latest[host].get("timestamp", ""):
-            latest[host] = r
 
     rows = list(latest.values())
     rows.sort(key=lambda r: (not r["reachable"], r["latency_ms"] if r["latency_ms"] is not None else 1e9, r["host"]))
@@ -268,39 +629,26 @@ def cmd_report(args):
     print(f"Total: {len(rows)}  |  UP: {up}  |  DOWN: {len(rows)-up}")
 
 def cmd_export(args):
-    results = load_results()
-    if not results:
+    import csv
+    latest = load_latest()
+    if not latest:
         print("No results to export. Run a scan first.")
         return
 
-    rows = results
-    if args.latest:
-        latest = {}
-        for r in results:
-            host = r["host"]
-            ts = r.get("timestamp") or ""
-            if host not in latest or ts > latest[host].get("timestamp", ""):
-                latest[host] = r
-        rows = list(latest.values())
+    # Full history is streamed straight from results.ndjson into the CSV
+    rows = latest.values() if args.latest else iter_results()
 
     out = Path(args.file)
     out.parent.mkdir(parents=True, exist_ok=True)
 
-    # Build fieldnames dynamically so new keys (attempts/successes) are included if present
-    base_fields = ["host", "reachable", "latency_ms", "timestamp", "raw_exit"]
-    extra_fields = set()
-    for r in rows:
-        extra_fields.update(r.keys())
-    # Keep order: base fields first, then any extras not already included
-    fieldnames = base_fields + [k for k in sorted(extra_fields) if k not in base_fields]
-
     with out.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for r in rows:
-            writer.writerow(r)
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_FIELDS)
+        # zip() draws from `counter` only after each row, so it ends up at the row count
+        counter = itertools.count()
+        writer.writerows(tuple(map(r.get, EXPORT_FIELDS)) for r, _ in zip(rows, counter))
 
-    print(f"Exported {len(rows)} row(s) to {out}")
+    print(f"Exported {next(counter)} row(s) to {out}")
 
 # ---------- CLI ----------
 def build_parser():
@@ -321,14 +669,19 @@ def build_parser():
     # ping
     p1 = sub.add_parser("ping", help="Ping a single host immediately")
     p1.add_argument("host")
-    p1.add_argument("--retries", type=int, default=3)
+    p1.add_argument("--retries", type=int, default=3, help="Max attempts; retries stop at the first reply")
+    p1.add_argument("--all-attempts", action="store_true",
+                   help="Always make every attempt and report the best (lowest) latency")
     p1.add_argument("--timeout-ms", type=int, default=1000)
     p1.set_defaults(func=cmd_ping)
 
     # scan
     s = sub.add_parser("scan", help="Ping all saved hosts and store results")
-    s.add_argument("--retries", type=int, default=3)
+    s.add_argument("--retries", type=int, default=3, help="Max attempts; retries stop at the first reply")
+    s.add_argument("--all-attempts", action="store_true",
+                    help="Always make every attempt and report the best (lowest) latency")
     s.add_argument("--timeout-ms", type=int, default=1000)
+    s.add_argument("--concurrency", type=int, default=32, help="Max concurrent ping processes (no ICMP socket, or hosts without an IPv4 address)")
     s.set_defaults(func=cmd_scan)
 
     rep = sub.add_parser("report", help="Show latest reachability/latency per host")
@@ -346,13 +699,9 @@ def build_parser():
 
 def main():
     parser = build_parser()
-       # TEMP: print the help your parser thinks it has
-    print("\n--- DEBUG: parser help dump ---")
-    print(parser.format_help())
-    print("--- END DEBUG ---\n")
-
     if len(sys.argv) == 1:
         # no args: just show help and exit cleanly
+        parser.print_help()
         return
     args = parser.parse_args()
     args.func(args)